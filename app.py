@@ -1,104 +1,95 @@
 import streamlit as st
-import pandas as pd
 import numpy as np
-import re
 import joblib
-from fuzzywuzzy import fuzz
-from datetime import datetime
-from tensorflow.keras.models import load_model
 import random
+import threading
+import logging
+import os
+from features import extract_features
+
+# Должна быть первой командой Streamlit: на старых версиях любой вывод до неё
+# (в т.ч. спиннер st.cache_resource при загрузке модели) приводит к исключению
+st.set_page_config(page_title="Проверка рецептов", layout="centered")
+
+# MLP на 9 признаков считается на CPU: не даём TF при импорте искать CUDA-устройства
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
+
+logger = logging.getLogger(__name__)
 
 
 # ======================
 # Загрузка модели и скейлера
 # ======================
-try:
-    model = load_model("models/recipe_duplicate_mlp.h5")
-    scaler = joblib.load("models/scaler.pkl")
-except Exception as e:
-    st.error(f"Ошибка загрузки модели или скейлера: {e}")
-    st.stop()
+@st.cache_resource
+def load_scaler():
+    return joblib.load("models/scaler.pkl")
 
-# ======================
-# Функции из Colab
-# ======================
+@st.cache_resource
+def load_keras_predict():
+    # Запасной путь, если TFLite-модель не загрузилась. TensorFlow импортируется лениво:
+    # первая отрисовка страницы не ждёт загрузки TF
+    import tensorflow as tf
+    from tensorflow.keras.models import load_model
 
-def normalize_dob(dob_str):
-    if pd.isna(dob_str) or dob_str == "":
-        return ""
-    s = str(dob_str).lower()
-    s = re.sub(r'[гг\.]', '', s)
-    s = re.sub(r'[^0-9a-zа-яё\s\-\/\.\']', '', s)
-    month_map = {
-        'янв': '01', 'фев': '02', 'мар': '03', 'апр': '04', 'май': '05', 'июн': '06',
-        'июл': '07', 'авг': '08', 'сен': '09', 'окт': '10', 'ноя': '11', 'дек': '12'
-    }
-    for word, num in month_map.items():
-        if word in s:
-            s = re.sub(word, num, s)
-    formats = ["%d.%m.%Y", "%d/%m/%Y", "%Y-%m-%d", "%d %m %Y", "%d.%m'%y"]
-    for fmt in formats:
+    model = load_model("models/recipe_duplicate_mlp.h5")
+
+    # Граф под фиксированную форму (1, 9) трассируется один раз и не перетрассируется
+    @tf.function(input_signature=[tf.TensorSpec([1, 9], tf.float32)])
+    def keras_predict(x):
+        return model(x, training=False)
+
+    return keras_predict
+
+@st.cache_resource
+def load_interpreter():
+    # MLP заранее сконвертирован в TFLite (convert_tflite.py): вызов интерпретатора
+    # на порядки дешевле model.predict
+    # Лёгкие рантаймы не тянут за собой весь TensorFlow; tf.lite.Interpreter — последний вариант
+    # (объявлен устаревшим в пользу LiteRT, но пока доступен)
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
         try:
-            dt = datetime.strptime(s, fmt)
-            return dt.strftime("%Y-%m-%d")
-        except:
-            continue
-    return ""
-
-def normalize_mnn(mnn):
-    if pd.isna(mnn):
-        return ""
-    s = str(mnn).strip().lower()
-    s = re.sub(r'\s+', ' ', s)
-    typo_fix = {"парацитамол": "парацетамол", "ибупрафен": "ибупрофен"}
-    for w, r in typo_fix.items():
-        if w in s:
-            s = s.replace(w, r)
-    return s
-
-def normalize_snils(snils_str):
-    if not isinstance(snils_str, str):
-        snils_str = str(snils_str)
-    digits = re.sub(r'\D', '', snils_str)
-    return digits if len(digits) == 11 else ""
-
-def extract_features(row_a, row_b):
-    mnn_a = normalize_mnn(row_a['МНН'])
-    mnn_b = normalize_mnn(row_b['МНН'])
-    mnn_ratio = fuzz.ratio(mnn_a, mnn_b) / 100.0
-    mnn_partial = fuzz.partial_ratio(mnn_a, mnn_b) / 100.0
-
-    issued_a = str(row_a['Выписано ЛС'])
-    issued_b = str(row_b['Выписано ЛС'])
-    issued_ratio = fuzz.ratio(issued_a, issued_b) / 100.0
-    issued_token = fuzz.token_sort_ratio(issued_a, issued_b) / 100.0
-
-    disp_a = str(row_a['ЛС (отпущенное / зарезервированное)'])
-    disp_b = str(row_b['ЛС (отпущенное / зарезервированное)'])
-    disp_ratio = fuzz.ratio(disp_a, disp_b) / 100.0
-
-    snils_a = normalize_snils(row_a['СНИЛС'])
-    snils_b = normalize_snils(row_b['СНИЛС'])
-    snils_match = 1.0 if snils_a == snils_b and len(snils_a) == 11 else 0.0
-
-    dob_a = normalize_dob(row_a['Дата рождения пациента'])
-    dob_b = normalize_dob(row_b['Дата рождения пациента'])
-    dob_match = 1.0 if dob_a == dob_b and dob_a != "" else 0.0
-
-    qty_issued_diff = abs(row_a['Кол-во выписано'] - row_b['Кол-во выписано'])
-    qty_disp_diff = abs(row_a['Кол-во отпущенного ЛС'] - row_b['Кол-во отпущенного ЛС'])
-
-    return np.array([
-        mnn_ratio,
-        mnn_partial,
-        issued_ratio,
-        issued_token,
-        disp_ratio,
-        snils_match,
-        dob_match,
-        qty_issued_diff,
-        qty_disp_diff
-    ])
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+    try:
+        interpreter = Interpreter(model_path="models/recipe_duplicate_mlp.tflite")
+        interpreter.allocate_tensors()
+    except Exception:
+        logger.exception("Не удалось загрузить TFLite-модель, инференс пойдёт через Keras")
+        return None
+    input_index = interpreter.get_input_details()[0]["index"]
+    output_index = interpreter.get_output_details()[0]["index"]
+    # Интерпретатор общий для всех сессий, а invoke() не потокобезопасен
+    return interpreter, input_index, output_index, threading.Lock()
+
+def predict_proba(features_scaled):
+    if tflite is None:
+        return float(keras_predict(features_scaled)[0, 0])
+    interpreter, input_index, output_index, lock = tflite
+    with lock:
+        interpreter.set_tensor(input_index, features_scaled)
+        interpreter.invoke()
+        return float(interpreter.get_tensor(output_index)[0][0])
+
+@st.cache_resource
+def feature_buffers():
+    # Скрипт Streamlit выполняется в разных потоках, поэтому у каждого потока свой буфер
+    return threading.local()
+
+def score_pair(row_a, row_b):
+    # Признаки пишутся и масштабируются на месте в заранее выделенный буфер (1, 9)
+    buffers = feature_buffers()
+    if not hasattr(buffers, "features"):
+        buffers.features = np.empty((1, 9), dtype=np.float32)
+    features = extract_features(row_a, row_b, out=buffers.features[0])
+    np.subtract(features, _MEAN, out=features)
+    np.divide(features, _SCALE, out=features)
+    return predict_proba(buffers.features)
 
 # ======================
 # База примеров
@@ -136,7 +127,6 @@ EXAMPLE_RECORDS = [
 # ======================
 # Streamlit UI
 # ======================
-st.set_page_config(page_title="Проверка рецептов", layout="centered")
 st.title("💊 Проверка: относятся ли записи к одному рецепту?")
 
 st.markdown("""
@@ -144,8 +134,21 @@ st.markdown("""
 Модель оценит, насколько вероятно, что они описывают **один и тот же рецепт**.
 """)
 
+try:
+    scaler = load_scaler()
+    tflite = load_interpreter()
+    keras_predict = load_keras_predict() if tflite is None else None
+except Exception as e:
+    st.error(f"Ошибка загрузки модели или скейлера: {e}")
+    st.stop()
+
+# Параметры StandardScaler: масштабируем вручную, без проверок scaler.transform
+_MEAN = scaler.mean_.astype(np.float32)
+_SCALE = scaler.scale_.astype(np.float32)
+
 # === Кнопка "Заполнить из базы" ===
-if st.button("🎲 Заполнить из базы"):
+# Колбэк выполняется до отрисовки виджетов, поэтому отдельный st.rerun() не нужен
+def fill_from_db():
     # Выбираем две разные записи из EXAMPLE_RECORDS
     if len(EXAMPLE_RECORDS) >= 2:
         rec1, rec2 = random.sample(EXAMPLE_RECORDS, 2)
@@ -166,40 +169,44 @@ if st.button("🎲 Заполнить из базы"):
             "qty2": rec2["Кол-во выписано"],
             "qty_disp2": rec2["Кол-во отпущенного ЛС"],
         })
-        st.rerun()
-
-# === Запись 1 ===
-st.subheader("Запись 1")
-col1, col2 = st.columns(2)
-
-with col1:
-    snils1 = st.text_input("СНИЛС*", key="snils1", placeholder="123 456 789 00")
-    dob1 = st.text_input("Дата рождения*", key="dob1", placeholder="01.01.1990")
-    mnn1 = st.text_input("МНН препарата*", key="mnn1", placeholder="Парацетамол")
-
-with col2:
-    issued1 = st.text_input("Выписано ЛС*", key="issued1", placeholder="Парацетамол таб. 500мг №20")
-    disp1 = st.text_input("Отпущено ЛС*", key="disp1", placeholder="Парацетамол таб. 500мг")
-    qty_issued1 = st.number_input("Кол-во выписано*", min_value=1, value=3, key="qty1")
-    qty_disp1 = st.number_input("Кол-во отпущенного*", min_value=1, value=1, key="qty_disp1")
-
-# === Запись 2 ===
-st.subheader("Запись 2")
-col3, col4 = st.columns(2)
-
-with col3:
-    snils2 = st.text_input("СНИЛС*", key="snils2", placeholder="123 456 789 00")
-    dob2 = st.text_input("Дата рождения*", key="dob2", placeholder="01.01.1990")
-    mnn2 = st.text_input("МНН препарата*", key="mnn2", placeholder="Парацетамол")
-
-with col4:
-    issued2 = st.text_input("Выписано ЛС*", key="issued2", placeholder="Парацетамол таб. 500мг №20")
-    disp2 = st.text_input("Отпущено ЛС*", key="disp2", placeholder="Парацетамол таб. 500мг")
-    qty_issued2 = st.number_input("Кол-во выписано*", min_value=1, value=3, key="qty2")
-    qty_disp2 = st.number_input("Кол-во отпущенного*", min_value=1, value=1, key="qty_disp2")
-
-# === Кнопка анализа ===
-if st.button("🔍 Проверить"):
+
+st.button("🎲 Заполнить из базы", on_click=fill_from_db)
+
+with st.form("check"):
+    # === Запись 1 ===
+    st.subheader("Запись 1")
+    col1, col2 = st.columns(2)
+
+    with col1:
+        snils1 = st.text_input("СНИЛС*", key="snils1", placeholder="123 456 789 00")
+        dob1 = st.text_input("Дата рождения*", key="dob1", placeholder="01.01.1990")
+        mnn1 = st.text_input("МНН препарата*", key="mnn1", placeholder="Парацетамол")
+
+    with col2:
+        issued1 = st.text_input("Выписано ЛС*", key="issued1", placeholder="Парацетамол таб. 500мг №20")
+        disp1 = st.text_input("Отпущено ЛС*", key="disp1", placeholder="Парацетамол таб. 500мг")
+        qty_issued1 = st.number_input("Кол-во выписано*", min_value=1, value=3, key="qty1")
+        qty_disp1 = st.number_input("Кол-во отпущенного*", min_value=1, value=1, key="qty_disp1")
+
+    # === Запись 2 ===
+    st.subheader("Запись 2")
+    col3, col4 = st.columns(2)
+
+    with col3:
+        snils2 = st.text_input("СНИЛС*", key="snils2", placeholder="123 456 789 00")
+        dob2 = st.text_input("Дата рождения*", key="dob2", placeholder="01.01.1990")
+        mnn2 = st.text_input("МНН препарата*", key="mnn2", placeholder="Парацетамол")
+
+    with col4:
+        issued2 = st.text_input("Выписано ЛС*", key="issued2", placeholder="Парацетамол таб. 500мг №20")
+        disp2 = st.text_input("Отпущено ЛС*", key="disp2", placeholder="Парацетамол таб. 500мг")
+        qty_issued2 = st.number_input("Кол-во выписано*", min_value=1, value=3, key="qty2")
+        qty_disp2 = st.number_input("Кол-во отпущенного*", min_value=1, value=1, key="qty_disp2")
+
+    # === Кнопка анализа ===
+    submitted = st.form_submit_button("🔍 Проверить")
+
+if submitted:
     # Проверка обязательных полей
     required_fields = [
         ("СНИЛС 1", snils1.strip()),
@@ -237,9 +244,7 @@ if st.button("🔍 Проверить"):
             "Кол-во отпущенного ЛС": qty_disp2
         }
 
-        features = extract_features(row1, row2)
-        features_scaled = scaler.transform([features])
-        prob = model.predict(features_scaled)[0][0]
+        prob = score_pair(row1, row2)
 
         if prob > 0.5:
             st.success(f"✅ С вероятностью **{prob:.1%}** эти записи относятся к **одному рецепту**.")
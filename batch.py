@@ -0,0 +1,136 @@
+import pandas as pd
+import numpy as np
+from itertools import combinations
+from numba import njit, prange
+from rapidfuzz import fuzz, process
+from features import normalize_dob, normalize_mnn, normalize_snils, fuzz_process, partial_ratio
+
+
+# ======================
+# Пакетная обработка: много пар записей за раз (UI этот модуль не импортирует)
+# ======================
+
+def _snils_codes(values):
+    # СНИЛС как int64, -1 — нет валидного номера
+    return np.array([int(s) if s else -1 for s in map(normalize_snils, values)], dtype=np.int64)
+
+def _dob_codes(values):
+    # Дата рождения как число YYYYMMDD, -1 — не распознана
+    return np.array([int(d.replace('-', '')) if d else -1 for d in map(normalize_dob, values)], dtype=np.int32)
+
+@njit(parallel=True, cache=True)
+def _eq_matrix(a, b):
+    out = np.empty((a.size, b.size), np.float32)
+    for i in prange(a.size):
+        for j in range(b.size):
+            out[i, j] = 1.0 if a[i] == b[j] and a[i] != -1 else 0.0
+    return out
+
+@njit(parallel=True, cache=True)
+def _abs_diff_matrix(a, b):
+    out = np.empty((a.size, b.size), np.float32)
+    for i in prange(a.size):
+        for j in range(b.size):
+            out[i, j] = abs(a[i] - b[j])
+    return out
+
+def _cdist_intr(a, b, **kwargs):
+    # Оценки округляются до целых процентов, как fuzzywuzzy.utils.intr в extract_features
+    # (np.rint, как и round, округляет половины к чётному)
+    return (np.rint(process.cdist(a, b, dtype=np.float64, workers=-1, **kwargs)) / 100.0).astype(np.float32)
+
+def extract_features_batch(rows_a, rows_b):
+    # Признаки для всех пар строк двух DataFrame: строка i * len(rows_b) + j — пара (i, j)
+    mnn_a = [normalize_mnn(v) for v in rows_a['МНН']]
+    mnn_b = [normalize_mnn(v) for v in rows_b['МНН']]
+    mnn_ratio = _cdist_intr(mnn_a, mnn_b, scorer=fuzz.ratio)
+    # partial_ratio в стиле fuzzywuzzy в cdist не встроить; названия МНН повторяются, и lru_cache
+    # внутри partial_ratio отдаёт большинство пар из кэша
+    mnn_partial = np.array([[partial_ratio(a, b) for b in mnn_b] for a in mnn_a],
+                           dtype=np.float32).reshape(len(mnn_a), len(mnn_b)) / 100.0
+
+    issued_a = rows_a['Выписано ЛС'].astype(str).tolist()
+    issued_b = rows_b['Выписано ЛС'].astype(str).tolist()
+    issued_ratio = _cdist_intr(issued_a, issued_b, scorer=fuzz.ratio)
+    issued_token = _cdist_intr(issued_a, issued_b, scorer=fuzz.token_sort_ratio, processor=fuzz_process)
+
+    disp_a = rows_a['ЛС (отпущенное / зарезервированное)'].astype(str).tolist()
+    disp_b = rows_b['ЛС (отпущенное / зарезервированное)'].astype(str).tolist()
+    disp_ratio = _cdist_intr(disp_a, disp_b, scorer=fuzz.ratio)
+
+    snils_match = _eq_matrix(_snils_codes(rows_a['СНИЛС']), _snils_codes(rows_b['СНИЛС']))
+    dob_match = _eq_matrix(_dob_codes(rows_a['Дата рождения пациента']),
+                           _dob_codes(rows_b['Дата рождения пациента']))
+
+    qty_issued_diff = _abs_diff_matrix(rows_a['Кол-во выписано'].to_numpy(dtype=np.float32),
+                                       rows_b['Кол-во выписано'].to_numpy(dtype=np.float32))
+    qty_disp_diff = _abs_diff_matrix(rows_a['Кол-во отпущенного ЛС'].to_numpy(dtype=np.float32),
+                                     rows_b['Кол-во отпущенного ЛС'].to_numpy(dtype=np.float32))
+
+    return np.stack([
+        mnn_ratio,
+        mnn_partial,
+        issued_ratio,
+        issued_token,
+        disp_ratio,
+        snils_match,
+        dob_match,
+        qty_issued_diff,
+        qty_disp_diff
+    ], axis=-1).reshape(-1, 9)
+
+def _block_positions(df):
+    # Блокировка: позиции строк с общими первыми 3 цифрами СНИЛС или общим годом рождения
+    snils_key = df['СНИЛС'].map(normalize_snils).str[:3]
+    dob_key = df['Дата рождения пациента'].map(normalize_dob).str[:4]
+    for key in (snils_key, dob_key):
+        for value, positions in key.groupby(key.to_numpy()).indices.items():
+            if value != "" and len(positions) > 1:
+                yield positions
+
+def candidate_pairs(df):
+    # Пары позиций строк (i, j), i < j, попавших хотя бы в один общий блок
+    seen = set()
+    for positions in _block_positions(df):
+        for pair in combinations(positions.tolist(), 2):
+            if pair not in seen:
+                seen.add(pair)
+                yield pair
+
+def predict_proba_batch(features, model, scaler):
+    features_scaled = (features - scaler.mean_.astype(np.float32)) / scaler.scale_.astype(np.float32)
+    return model.predict(features_scaled, verbose=0)[:, 0]
+
+def score_candidate_pairs(df, model, scaler, fast_reject_threshold=0):
+    # Вероятность дубликата для пар-кандидатов; i, j — позиции строк в df (как в df.iloc).
+    # Признаки блока считаются одним extract_features_batch(block, block), из него берётся верхний
+    # треугольник. Пары, которые отсеял бы extract_features_maybe, в модель не идут и получают 0
+    n = len(df)
+    codes = [np.empty(0, dtype=np.int64)]
+    features = [np.empty((0, 9), dtype=np.float32)]
+    for positions in _block_positions(df):
+        m = len(positions)
+        upper_i, upper_j = np.triu_indices(m, k=1)
+        block = df.iloc[positions]
+        codes.append(positions[upper_i].astype(np.int64) * n + positions[upper_j])
+        features.append(extract_features_batch(block, block)[upper_i * m + upper_j])
+    # Пара могла попасть и в блок по СНИЛС, и в блок по году рождения
+    codes, first = np.unique(np.concatenate(codes), return_index=True)
+    features = np.concatenate(features)[first]
+    i, j = np.divmod(codes, n)
+
+    snils = _snils_codes(df['СНИЛС'])
+    dob = _dob_codes(df['Дата рождения пациента'])
+    qty_issued = df['Кол-во выписано'].to_numpy(dtype=np.float32)
+    rejected = ((snils[i] != -1) & (snils[j] != -1) & (snils[i] != snils[j])
+                & (dob[i] != -1) & (dob[j] != -1) & (dob[i] != dob[j])
+                & (np.abs(qty_issued[i] - qty_issued[j]) >= fast_reject_threshold))
+
+    probs = np.zeros(len(codes), dtype=np.float32)
+    if not rejected.all():
+        probs[~rejected] = predict_proba_batch(features[~rejected], model, scaler)
+    return pd.DataFrame({
+        "i": i,
+        "j": j,
+        "prob": probs
+    })
\ No newline at end of file
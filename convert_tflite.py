@@ -0,0 +1,9 @@
+# Офлайн-конвертация MLP в TFLite для app.py. Запускать после каждого переобучения модели:
+#     python convert_tflite.py
+import tensorflow as tf
+from tensorflow.keras.models import load_model
+
+model = load_model("models/recipe_duplicate_mlp.h5")
+converter = tf.lite.TFLiteConverter.from_keras_model(model)
+with open("models/recipe_duplicate_mlp.tflite", "wb") as f:
+    f.write(converter.convert())
\ No newline at end of file
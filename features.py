@@ -0,0 +1,177 @@
+import pandas as pd
+import numpy as np
+import re
+import calendar
+from functools import lru_cache
+from rapidfuzz import fuzz
+from rapidfuzz.distance import Levenshtein
+
+
+# ======================
+# Функции из Colab
+# ======================
+
+MONTH_MAP = {
+    'янв': '01', 'фев': '02', 'мар': '03', 'апр': '04', 'май': '05', 'июн': '06',
+    'июл': '07', 'авг': '08', 'сен': '09', 'окт': '10', 'ноя': '11', 'дек': '12'
+}
+
+_DOB_GG = re.compile(r'[гг\.]')
+_DOB_CLEAN = re.compile(r'[^0-9a-zа-яё\s\-\/\.\']')
+_MONTH_RE = re.compile('|'.join(MONTH_MAP))
+# Те же регулярки, что datetime.strptime строит для форматов
+# "%d.%m.%Y", "%d/%m/%Y", "%Y-%m-%d", "%d %m %Y", "%d.%m'%y" — но без исключений на каждой неудаче
+_D = r'(?P<d>3[01]|[12]\d|0[1-9]|[1-9]| [1-9])'
+_M = r'(?P<m>1[0-2]|0[1-9]|[1-9])'
+_Y = r'(?P<y>\d{4})'
+_DOB_FORMATS = [re.compile(p) for p in (
+    _D + r'\.' + _M + r'\.' + _Y,
+    _D + '/' + _M + '/' + _Y,
+    _Y + '-' + _M + '-' + _D,
+    _D + r'\s+' + _M + r'\s+' + _Y,
+    _D + r'\.' + _M + "'" + r'(?P<yy>\d{2})',
+)]
+_WS = re.compile(r'\s+')
+
+def normalize_dob(dob_str):
+    if pd.isna(dob_str) or dob_str == "":
+        return ""
+    return _normalize_dob(str(dob_str))
+
+@lru_cache(maxsize=4096)
+def _normalize_dob(s):
+    s = s.lower()
+    s = _DOB_GG.sub('', s)
+    s = _DOB_CLEAN.sub('', s)
+    s = _MONTH_RE.sub(lambda m: MONTH_MAP[m.group(0)], s)
+    return _parse_dob(s)
+
+def _parse_dob(s):
+    for fmt in _DOB_FORMATS:
+        match = fmt.fullmatch(s)
+        if match:
+            break
+    else:
+        return ""
+    parts = match.groupdict()
+    day, month = int(parts['d']), int(parts['m'])
+    if parts.get('yy') is not None:
+        # Двузначный год как в strptime: 69-99 -> 19xx, 00-68 -> 20xx
+        year = int(parts['yy'])
+        year += 1900 if year >= 69 else 2000
+    else:
+        year = int(parts['y'])
+    if year < 1 or day > calendar.monthrange(year, month)[1]:
+        return ""
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+def normalize_mnn(mnn):
+    if pd.isna(mnn):
+        return ""
+    return _normalize_mnn(str(mnn))
+
+@lru_cache(maxsize=4096)
+def _normalize_mnn(s):
+    s = s.strip().lower()
+    s = _WS.sub(' ', s)
+    typo_fix = {"парацитамол": "парацетамол", "ибупрафен": "ибупрофен"}
+    for w, r in typo_fix.items():
+        if w in s:
+            s = s.replace(w, r)
+    return s
+
+def normalize_snils(snils_str):
+    if not isinstance(snils_str, str):
+        snils_str = str(snils_str)
+    return _normalize_snils(snils_str)
+
+@lru_cache(maxsize=4096)
+def _normalize_snils(snils_str):
+    digits = snils_str if snils_str.isdecimal() else ''.join(filter(str.isdecimal, snils_str))
+    return digits if len(digits) == 11 else ""
+
+_LATIN1_SUPPLEMENT = dict.fromkeys(range(128, 256))
+_NON_WORD = re.compile(r'\W')
+
+def fuzz_process(s):
+    # Повторяет full_process(force_ascii=True) из fuzzywuzzy, на котором обучалась модель:
+    # удаляются только символы с кодами 128-255 (кириллица остаётся), "_" сохраняется
+    return _NON_WORD.sub(' ', s.translate(_LATIN1_SUPPLEMENT)).lower().strip()
+
+def intr(n):
+    # Округление как fuzzywuzzy.utils.intr: модель обучалась на целых процентах
+    return int(round(n))
+
+@lru_cache(maxsize=4096)
+def partial_ratio(s1, s2):
+    # Повторяет fuzzywuzzy.fuzz.partial_ratio (бэкенд python-Levenshtein): окна длины короткой
+    # строки выравниваются по matching blocks. fuzz.partial_ratio из rapidfuzz ищет окно иначе
+    if s1 == s2:
+        return 100
+    if not s1 or not s2:
+        return 0
+    shorter, longer = (s1, s2) if len(s1) <= len(s2) else (s2, s1)
+    best = 0.0
+    for block in Levenshtein.editops(shorter, longer).as_matching_blocks():
+        long_start = max(block.b - block.a, 0)
+        r = fuzz.ratio(shorter, longer[long_start:long_start + len(shorter)])
+        if r > 99.5:
+            return 100
+        best = max(best, r)
+    return intr(best)
+
+def extract_features(row_a, row_b, out=None):
+    # out — необязательный буфер формы (9,), например строка заранее выделенной матрицы (N, 9)
+    mnn_a = normalize_mnn(row_a['МНН'])
+    mnn_b = normalize_mnn(row_b['МНН'])
+    mnn_ratio = intr(fuzz.ratio(mnn_a, mnn_b)) / 100.0
+    mnn_partial = partial_ratio(mnn_a, mnn_b) / 100.0
+
+    issued_a = str(row_a['Выписано ЛС'])
+    issued_b = str(row_b['Выписано ЛС'])
+    issued_ratio = intr(fuzz.ratio(issued_a, issued_b)) / 100.0
+    issued_token = intr(fuzz.token_sort_ratio(issued_a, issued_b, processor=fuzz_process)) / 100.0
+
+    disp_a = str(row_a['ЛС (отпущенное / зарезервированное)'])
+    disp_b = str(row_b['ЛС (отпущенное / зарезервированное)'])
+    disp_ratio = intr(fuzz.ratio(disp_a, disp_b)) / 100.0
+
+    snils_a = normalize_snils(row_a['СНИЛС'])
+    snils_b = normalize_snils(row_b['СНИЛС'])
+    snils_match = 1.0 if snils_a == snils_b and len(snils_a) == 11 else 0.0
+
+    dob_a = normalize_dob(row_a['Дата рождения пациента'])
+    dob_b = normalize_dob(row_b['Дата рождения пациента'])
+    dob_match = 1.0 if dob_a == dob_b and dob_a != "" else 0.0
+
+    qty_issued_diff = abs(row_a['Кол-во выписано'] - row_b['Кол-во выписано'])
+    qty_disp_diff = abs(row_a['Кол-во отпущенного ЛС'] - row_b['Кол-во отпущенного ЛС'])
+
+    if out is None:
+        out = np.empty(9, dtype=np.float32)
+    out[:] = (
+        mnn_ratio,
+        mnn_partial,
+        issued_ratio,
+        issued_token,
+        disp_ratio,
+        snils_match,
+        dob_match,
+        qty_issued_diff,
+        qty_disp_diff
+    )
+    return out
+
+def extract_features_maybe(row_a, row_b, fast_reject_threshold=0, out=None):
+    # Быстрый отсев: оба СНИЛС и обе даты рождения заданы и не совпадают (а кол-во выписано
+    # различается не меньше чем на fast_reject_threshold) — заведомо разные рецепты, None
+    snils_a = normalize_snils(row_a['СНИЛС'])
+    snils_b = normalize_snils(row_b['СНИЛС'])
+    dob_a = normalize_dob(row_a['Дата рождения пациента'])
+    dob_b = normalize_dob(row_b['Дата рождения пациента'])
+    qty_issued_diff = abs(row_a['Кол-во выписано'] - row_b['Кол-во выписано'])
+    if (snils_a and snils_b and snils_a != snils_b
+            and dob_a and dob_b and dob_a != dob_b
+            and qty_issued_diff >= fast_reject_threshold):
+        return None
+    return extract_features(row_a, row_b, out=out)
\ No newline at end of file
@@ -0,0 +1,120 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from batch import candidate_pairs, extract_features_batch, score_candidate_pairs
+from features import extract_features, extract_features_maybe
+
+
+RECORDS = pd.DataFrame([
+    {
+        "СНИЛС": "12345678900",
+        "Дата рождения пациента": "1990-01-01",
+        "МНН": "Ибупрофен",
+        "Выписано ЛС": "Ибупрофен таблетки 200мг №30",
+        "ЛС (отпущенное / зарезервированное)": "Ибупрофен таб. 200мг",
+        "Кол-во выписано": 2,
+        "Кол-во отпущенного ЛС": 2
+    },
+    {
+        "СНИЛС": "123-456-789 00",
+        "Дата рождения пациента": "01/01/1990",
+        "МНН": "Парацетамол",
+        "Выписано ЛС": "Парацетамол таб. 500мг – №20",
+        "ЛС (отпущенное / зарезервированное)": "Парацетамол таб. 500мг",
+        "Кол-во выписано": 3,
+        "Кол-во отпущенного ЛС": 2
+    },
+    {
+        "СНИЛС": "123 456 789",
+        "Дата рождения пациента": "1 янв 1990",
+        "МНН": "парацитамол",
+        "Выписано ЛС": "ПАРАЦЕТАМОЛ ТАБ 500МГ N20",
+        "ЛС (отпущенное / зарезервированное)": "Парацетамол таб 500мг",
+        "Кол-во выписано": 3,
+        "Кол-во отпущенного ЛС": 1
+    }
+])
+
+
+def test_extract_features_batch_matches_extract_features():
+    rows = RECORDS.to_dict("records")
+    expected = np.array([extract_features(a, b) for a in rows for b in rows])
+    np.testing.assert_allclose(extract_features_batch(RECORDS, RECORDS), expected, atol=1e-6)
+
+
+class FeatureSumModel:
+    # Вместо MLP: "вероятность" = сумма признаков, чтобы проверить, что паре достались её признаки
+    def predict(self, x, verbose=0):
+        return x.sum(axis=1, keepdims=True)
+
+
+class IdentityScaler:
+    mean_ = np.zeros(9)
+    scale_ = np.ones(9)
+
+
+def make_record(snils, dob, mnn="Парацетамол", qty=3):
+    return {
+        "СНИЛС": snils,
+        "Дата рождения пациента": dob,
+        "МНН": mnn,
+        "Выписано ЛС": f"{mnn} таб. 500мг №20",
+        "ЛС (отпущенное / зарезервированное)": f"{mnn} таб. 500мг",
+        "Кол-во выписано": qty,
+        "Кол-во отпущенного ЛС": 1
+    }
+
+
+def random_frame(n, seed=0):
+    rng = random.Random(seed)
+    records = [
+        make_record(
+            snils=rng.choice(["12345678900", "123-456-789 01", "99988877766", "", "1234567890x"]),
+            dob=rng.choice(["1990-01-01", "01/02/1991", "1 янв 1990", "", "1990-01-02"]),
+            mnn=rng.choice(["Ибупрофен", "парацитамол", "Парацетамол"]),
+            qty=rng.randint(1, 4)
+        )
+        for _ in range(n)
+    ]
+    # Неуникальный индекс: пары возвращаются позициями строк, а не метками
+    return pd.DataFrame(records, index=[7] * n)
+
+
+# Отсев в score_candidate_pairs векторизован отдельно и должен совпадать с extract_features_maybe
+@pytest.mark.parametrize("threshold", [0, 2])
+def test_score_candidate_pairs_matches_pairwise_path(threshold):
+    df = random_frame(40)
+    result = score_candidate_pairs(df, FeatureSumModel(), IdentityScaler(), fast_reject_threshold=threshold)
+
+    assert list(zip(result["i"], result["j"])) == sorted(candidate_pairs(df))
+    rows = df.to_dict("records")
+    for i, j, prob in zip(result["i"], result["j"], result["prob"]):
+        features = extract_features_maybe(rows[i], rows[j], fast_reject_threshold=threshold)
+        expected = 0.0 if features is None else features.sum()
+        assert prob == pytest.approx(expected, rel=1e-5)
+
+
+def test_pair_in_snils_and_dob_blocks_is_scored_once():
+    df = pd.DataFrame([
+        make_record("12345678900", "1990-01-01"),
+        make_record("123-456-789 00", "01/01/1990"),
+        make_record("99988877766", "1985-05-05"),
+    ], index=[3, 3, 3])
+    result = score_candidate_pairs(df, FeatureSumModel(), IdentityScaler())
+
+    assert list(zip(result["i"], result["j"])) == [(0, 1)]
+    rows = df.to_dict("records")
+    assert result["prob"][0] == pytest.approx(extract_features(rows[0], rows[1]).sum(), rel=1e-5)
+
+
+@pytest.mark.parametrize("records", [[], [make_record("12345678900", "1990-01-01")]])
+def test_score_candidate_pairs_without_pairs(records):
+    df = pd.DataFrame(records, columns=list(make_record("", "")))
+    result = score_candidate_pairs(df, FeatureSumModel(), IdentityScaler())
+
+    assert list(result.columns) == ["i", "j", "prob"]
+    assert len(result) == 0
+    assert list(candidate_pairs(df)) == []
\ No newline at end of file
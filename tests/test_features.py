@@ -0,0 +1,148 @@
+import random
+from datetime import datetime
+
+import numpy as np
+import pytest
+from rapidfuzz import fuzz
+
+from features import (
+    _parse_dob, extract_features, extract_features_maybe, fuzz_process, intr, normalize_dob, partial_ratio
+)
+
+
+# Значения fuzz.token_sort_ratio из fuzzywuzzy 0.18.0 (+ python-Levenshtein), на которых обучалась модель
+@pytest.mark.parametrize("a, b, expected", [
+    ("Ибупрофен таблетки", "Парацетамол таб", 42),
+    ("Парацетамол таб. 500мг – №20", "ПАРАЦЕТАМОЛ ТАБ 500МГ N20", 86),
+    ("Ибупрофен таблетки 200мг №30", "Ибупрофен таб. 200мг", 83),
+    ("ПАРАЦЕТАМОЛ ТАБ 500МГ N20", "Ибупрофен таблетки 200мг №30", 54),
+])
+def test_token_sort_ratio_matches_fuzzywuzzy(a, b, expected):
+    assert intr(fuzz.token_sort_ratio(a, b, processor=fuzz_process)) == expected
+
+
+# Значения fuzz.partial_ratio и fuzz.ratio из fuzzywuzzy 0.18.0 (+ python-Levenshtein)
+@pytest.mark.parametrize("a, b, partial, ratio", [
+    ("парацетамол", "ацетилсалициловая кислота", 27, 39),
+    ("ибупрофен", "парацетамол", 22, 30),
+    ("парацетамол", "парацетамол 500", 100, 85),
+    ("амоксициллин", "амоксиклав", 70, 64),
+    ("ибупрофен", "ибупрофен", 100, 100),
+    ("", "ибупрофен", 0, 0),
+])
+def test_partial_ratio_and_ratio_match_fuzzywuzzy(a, b, partial, ratio):
+    assert partial_ratio(a, b) == partial
+    assert partial_ratio(b, a) == partial
+    assert intr(fuzz.ratio(a, b)) == ratio
+
+
+@pytest.mark.parametrize("s, expected", [
+    ("Парацетамол Таб. 500мг", "парацетамол таб  500мг"),
+    ("таб_500 №20 ©é", "таб_500  20"),
+])
+def test_fuzz_process_matches_fuzzywuzzy_full_process(s, expected):
+    assert fuzz_process(s) == expected
+
+
+def make_record(snils, dob, qty=3):
+    return {
+        "СНИЛС": snils,
+        "Дата рождения пациента": dob,
+        "МНН": "Парацетамол",
+        "Выписано ЛС": "Парацетамол таб. 500мг №20",
+        "ЛС (отпущенное / зарезервированное)": "Парацетамол таб. 500мг",
+        "Кол-во выписано": qty,
+        "Кол-во отпущенного ЛС": 1
+    }
+
+
+@pytest.mark.parametrize("a, b, threshold, rejected", [
+    # СНИЛС и дата рождения заданы у обоих и различаются
+    (make_record("12345678900", "1990-01-01"), make_record("99988877766", "1985-05-05"), 0, True),
+    # Совпадает СНИЛС (в другом формате записи)
+    (make_record("12345678900", "1990-01-01"), make_record("123-456-789 00", "1985-05-05"), 0, False),
+    # Совпадает дата рождения
+    (make_record("12345678900", "1990-01-01"), make_record("99988877766", "01/01/1990"), 0, False),
+    # Невалидный СНИЛС или нераспознанная дата — не отсеиваем
+    (make_record("1234567890", "1990-01-01"), make_record("99988877766", "1985-05-05"), 0, False),
+    (make_record("12345678900", "01.01.1990"), make_record("99988877766", "1985-05-05"), 0, False),
+    # Порог по разнице "Кол-во выписано"
+    (make_record("12345678900", "1990-01-01", qty=3), make_record("99988877766", "1985-05-05", qty=4), 2, False),
+    (make_record("12345678900", "1990-01-01", qty=3), make_record("99988877766", "1985-05-05", qty=5), 2, True),
+])
+def test_extract_features_maybe_fast_reject(a, b, threshold, rejected):
+    assert (extract_features_maybe(a, b, fast_reject_threshold=threshold) is None) == rejected
+
+
+def test_extract_features_writes_into_row_view():
+    a = make_record("12345678900", "1990-01-01", qty=3)
+    b = make_record("123-456-789 00", "01/01/1990", qty=5)
+    matrix = np.full((3, 9), -1.0, dtype=np.float32)
+
+    result = extract_features(a, b, out=matrix[1])
+
+    assert result is not None and np.shares_memory(result, matrix)
+    np.testing.assert_array_equal(matrix[1], extract_features(a, b))
+    np.testing.assert_array_equal(matrix[[0, 2]], -1.0)
+
+
+def strptime_dob(s):
+    # Исходный разбор даты из Colab, с которым должен совпадать _parse_dob. isoformat() вместо
+    # strftime("%Y-%m-%d"): glibc не дополняет нулями годы < 1000, _parse_dob всегда пишет 4 цифры
+    for fmt in ["%d.%m.%Y", "%d/%m/%Y", "%Y-%m-%d", "%d %m %Y", "%d.%m'%y"]:
+        try:
+            return datetime.strptime(s, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return ""
+
+
+@pytest.mark.parametrize("s, expected", [
+    ("05.03.1990", "1990-03-05"),
+    ("05/03/1990", "1990-03-05"),
+    ("1990-03-05", "1990-03-05"),
+    ("5 3  1990", "1990-03-05"),
+    ("05.03'90", "1990-03-05"),
+    (" 5/3/1990", "1990-03-05"),
+    ("1990-3-5", "1990-03-05"),
+    # Двузначный год: 00-68 -> 20xx, 69-99 -> 19xx
+    ("05.03'68", "2068-03-05"),
+    ("05.03'69", "1969-03-05"),
+    # 29 февраля: високосный, невисокосный и вековой невисокосный год
+    ("29/02/2000", "2000-02-29"),
+    ("29/02/2001", ""),
+    ("29/02/1900", ""),
+    # 31-е число в 30-дневном месяце
+    ("30/04/1990", "1990-04-30"),
+    ("31/04/1990", ""),
+    # Нулевой год
+    ("01/01/0000", ""),
+    ("0000-01-01", ""),
+    ("05-03-1990", ""),
+    ("", ""),
+])
+def test_parse_dob(s, expected):
+    assert _parse_dob(s) == expected
+    assert strptime_dob(s) == expected
+
+
+def test_parse_dob_matches_strptime_on_random_strings():
+    rng = random.Random(0)
+    alphabet = "0123456789012345678901234567890123 ./-'\t１２"
+    for _ in range(20000):
+        s = "".join(rng.choice(alphabet) for _ in range(rng.randint(4, 11)))
+        assert _parse_dob(s) == strptime_dob(s), s
+
+
+@pytest.mark.parametrize("dob, expected", [
+    ("1 янв 1990", "1990-01-01"),
+    ("29 фев 2000", "2000-02-29"),
+    ("01/01/1990", "1990-01-01"),
+    # Точки удаляются до разбора (как в исходном коде из Colab), поэтому эти форматы не распознаются
+    ("01.01.1990", ""),
+    ("1 янв 1990 г.", ""),
+    ("", ""),
+    (None, ""),
+])
+def test_normalize_dob(dob, expected):
+    assert normalize_dob(dob) == expected
\ No newline at end of file
@@ -0,0 +1,24 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+
+MODELS = Path(__file__).resolve().parent.parent / "models"
+
+
+def test_tflite_matches_keras_model():
+    # models/recipe_duplicate_mlp.tflite должен быть пересобран convert_tflite.py после переобучения
+    model = tf.keras.models.load_model(MODELS / "recipe_duplicate_mlp.h5")
+    interpreter = tf.lite.Interpreter(model_path=str(MODELS / "recipe_duplicate_mlp.tflite"))
+    interpreter.allocate_tensors()
+    input_index = interpreter.get_input_details()[0]["index"]
+    output_index = interpreter.get_output_details()[0]["index"]
+
+    x = np.random.default_rng(0).normal(size=(16, 9)).astype(np.float32)
+    for row in x:
+        interpreter.set_tensor(input_index, row[None, :])
+        interpreter.invoke()
+        np.testing.assert_allclose(interpreter.get_tensor(output_index),
+                                   model(row[None, :], training=False), rtol=1e-5, atol=1e-6)
\ No newline at end of file